@@ -6,27 +6,263 @@ This tool removes files and directories based on gitignore-style patterns
 defined in a .cleanignore file.
 """
 
+import os
 import pathlib
-import shutil
+import re
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pathspec
 
 IGNORE_FILE = ".cleanignore"
+GLOB_CHARS = frozenset("*?[\\")
+NAMED_GROUP = re.compile(r"\(\?P<\w+>")
+MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# Unlink files relative to an open directory descriptor (POSIX unlinkat);
+# directories themselves are always opened and removed by full path
+DIR_FD_SUPPORTED = os.unlink in os.supports_dir_fd and os.scandir in os.supports_fd
+DIR_OPEN_FLAGS = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | getattr(os, "O_NOFOLLOW", 0)
+
+def compile_patterns(patterns):
+    """Splits patterns into plain name lookups and a residual matcher.
+
+    Patterns without wildcards or slashes ("node_modules", "build/") and
+    simple extension globs ("*.pyc") only depend on an entry's name, so they
+    are checked with set and suffix lookups instead of regexes. The rest are
+    joined into one regex so each path is matched in a single call rather
+    than once per pattern. Negation makes pattern order significant, so then
+    everything goes to pathspec.match_file, and the returned negated flag
+    tells the walk not to prune matched directories.
+    """
+    names = set()
+    dir_names = set()
+    suffixes = []
+    residual = []
+    negated = any(line.startswith("!") for line in patterns)
+    for line in patterns:
+        if not line or line.startswith("#"):
+            continue
+        dir_only = line.endswith("/")
+        name = line[:-1] if dir_only else line
+        if negated or line != line.strip() or not name or "/" in name:
+            residual.append(line)
+        elif not GLOB_CHARS.intersection(name):
+            (dir_names if dir_only else names).add(name)
+        elif name[0] == "*" and not dir_only and not GLOB_CHARS.intersection(name[1:]):
+            suffixes.append(name[1:])
+        else:
+            residual.append(line)
+    if not residual:
+        match = None
+    else:
+        spec = pathspec.PathSpec.from_lines('gitwildmatch', residual)
+        match = spec.match_file
+        regexes = [
+            # Each pattern names its groups the same way; they must be unique once joined
+            NAMED_GROUP.sub("(?:", p.regex.pattern)
+            for p in spec.patterns
+            if p.include is not None
+        ]
+        if not negated and regexes:
+            try:
+                match = re.compile("|".join(f"(?:{r})" for r in regexes)).match
+            except re.error:
+                # The joining relies on how pathspec writes its regexes; if a
+                # release changes that, keep its own matcher
+                pass
+    return frozenset(names), frozenset(dir_names), tuple(suffixes), match, negated
+
+def _scan_dir(dir_path, under_match, root_len, compiled, matches, kept, subdirs):
+    """Matches the entries of one directory.
+
+    Matches are appended to matches; directories to descend into are
+    appended to subdirs as (path, under_match) pairs. Normally only
+    unmatched directories are descended into. With negation patterns,
+    matched directories are walked too, and unmatched entries below a match
+    are appended to kept (as relative paths) so their ancestors survive.
+
+    Returns the OSError if the directory can't be read, else None. Nothing
+    is printed, since this runs in worker threads.
+    """
+    names, dir_names, suffixes, match, negated = compiled
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                name = entry.name
+                # Junctions are links too: never walk into another tree through one
+                is_dir = entry.is_dir(follow_symlinks=False) and not entry.is_junction()
+                # Slicing avoids Path.relative_to; the string is reused for output
+                rel_path = entry.path[root_len:]
+                if name in names or name.endswith(suffixes) or (is_dir and name in dir_names):
+                    matched = True
+                elif match is not None:
+                    # pathspec expects posix relative strings
+                    spec_path = rel_path.replace(os.sep, "/") if os.sep != "/" else rel_path
+                    # Directory-only patterns like "build/" need the trailing slash
+                    matched = bool(match(spec_path + "/" if is_dir else spec_path))
+                else:
+                    matched = False
+                if matched:
+                    matches.append((pathlib.Path(entry.path), rel_path, is_dir))
+                    if negated and is_dir:
+                        subdirs.append((entry.path, True))
+                else:
+                    if under_match:
+                        kept.append(rel_path)
+                    if is_dir:
+                        subdirs.append((entry.path, under_match))
+    except OSError as e:
+        # Like rglob, skip directories that can't be read rather than abort the walk
+        return e
+    return None
+
+def _walk_subtree(dir_path, under_match, root_len, compiled):
+    """Returns the matches, kept entries and skipped directories below dir_path.
+
+    Skipped directories are (dir_path, error) pairs.
+    """
+    matches = []
+    kept = []
+    skipped = []
+    pending = [(dir_path, under_match)]
+    while pending:
+        path, path_under_match = pending.pop()
+        error = _scan_dir(path, path_under_match, root_len, compiled, matches, kept, pending)
+        if error is not None:
+            skipped.append((path, error))
+    return matches, kept, skipped
+
+def _drop_covered_matches(matches, kept):
+    """Reduces matches to top-most entries that can be removed as a whole.
+
+    A matched directory with a kept entry somewhere below it is not
+    returned, so it survives; its own matched contents are returned
+    instead. Anything below a returned directory is dropped.
+    """
+    holds_kept = set()
+    for rel_path in kept:
+        parent = os.path.dirname(rel_path)
+        while parent and parent not in holds_kept:
+            holds_kept.add(parent)
+            parent = os.path.dirname(parent)
+
+    removed_dirs = set()
+    result = []
+    # Parents sort before their children, so each ancestor is decided first
+    for item in sorted(matches, key=lambda m: m[1].count(os.sep)):
+        _path, rel_path, is_dir = item
+        parent = os.path.dirname(rel_path)
+        while parent and parent not in removed_dirs:
+            parent = os.path.dirname(parent)
+        if parent:
+            continue
+        if is_dir:
+            if rel_path in holds_kept:
+                continue
+            removed_dirs.add(rel_path)
+        result.append(item)
+    return result
 
 def get_paths_to_clean(root, patterns):
-    """Matches files based on gitignore-style logic."""
-    spec = pathspec.PathSpec.from_lines('gitwildmatch', patterns)
-    
-    # We walk the tree and collect everything that matches the spec
+    """Matches files based on gitignore-style logic.
+
+    A matched directory is returned as a whole and not descended into, so
+    the result only holds the top-most matches, as (path, rel_path, is_dir)
+    tuples where rel_path is the path relative to root as a string.
+
+    If .cleanignore has negation patterns ("!build/keep.txt"), matched
+    directories are walked as well. A matched directory is then only
+    returned if nothing below it is re-included. Otherwise it stays, and
+    only its matched contents are returned.
+    """
+    compiled = compile_patterns(patterns)
+    root_str = str(root)
+    # join adds the separator only when root doesn't already end in one ("/", "C:\\")
+    root_len = len(os.path.join(root_str, ""))
+
     matches = []
-    # We use rglob("*") to get every file/folder and check against spec
-    for path in root.rglob("*"):
-        # pathspec expects relative strings
-        rel_path = str(path.relative_to(root))
-        if spec.match_file(rel_path):
-            matches.append(path)
+    kept = []
+    top_dirs = []
+    skipped = []
+    error = _scan_dir(root_str, False, root_len, compiled, matches, kept, top_dirs)
+    if error is not None:
+        skipped.append((root_str, error))
+
+    # Top-level subtrees are independent; scandir releases the GIL, so walk
+    # them in parallel
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = [
+            ex.submit(_walk_subtree, d, under_match, root_len, compiled)
+            for d, under_match in top_dirs
+        ]
+        for future in futures:
+            subtree_matches, subtree_kept, subtree_skipped = future.result()
+            matches.extend(subtree_matches)
+            kept.extend(subtree_kept)
+            skipped.extend(subtree_skipped)
+    # Reported here rather than in the workers so output lines don't interleave
+    for dir_path, error in skipped:
+        print(f"✘ Skipping {dir_path[root_len:] or '.'}: {error}")
+    negated = compiled[-1]
+    if negated:
+        matches = _drop_covered_matches(matches, kept)
     return matches
 
+def _unlink_files_at(dir_path, subdirs):
+    """Unlinks the non-directory entries of dir_path and queues its subdirectories.
+
+    Files are removed relative to an open descriptor of dir_path
+    (unlinkat), so the kernel does not walk the full path again for each
+    one. Only that one descriptor is held open.
+    """
+    fd = os.open(dir_path, DIR_OPEN_FLAGS)
+    try:
+        with os.scandir(fd) as it:
+            entries = [(entry.name, entry.is_dir(follow_symlinks=False)) for entry in it]
+        for name, is_dir in entries:
+            if is_dir:
+                subdirs.append(os.path.join(dir_path, name))
+            else:
+                os.unlink(name, dir_fd=fd)
+    finally:
+        os.close(fd)
+
+def _fast_rmtree(path):
+    """Removes a directory tree with one scandir pass and plain unlink/rmdir calls.
+
+    Unlike shutil.rmtree there is no extra stat per entry: the file type comes
+    from the directory listing. Symlinks and junctions are unlinked, never
+    followed. The walk uses an explicit stack, so deep trees don't hit the
+    recursion limit.
+    """
+    if os.path.islink(path) or os.path.isjunction(path):
+        raise OSError(f"Cannot call rmtree on a symbolic link or junction: {path}")
+    stack = [os.fspath(path)]
+    dirs = []
+    while stack:
+        dir_path = stack.pop()
+        if DIR_FD_SUPPORTED:
+            _unlink_files_at(dir_path, stack)
+        else:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    # Like shutil.rmtree, treat NTFS junctions as links: unlink
+                    # them rather than deleting their target's contents
+                    if entry.is_dir(follow_symlinks=False) and not entry.is_junction():
+                        stack.append(entry.path)
+                    else:
+                        os.unlink(entry.path)
+        dirs.append(dir_path)
+    # Subdirectories are always listed after their parent, so remove in reverse
+    for dir_path in reversed(dirs):
+        os.rmdir(dir_path)
+
+def remove_path(path, is_dir):
+    """Removes a file or a whole directory tree."""
+    if is_dir:
+        _fast_rmtree(path)
+    else:
+        path.unlink()
+
 def clean(perform_delete=False):
     root = pathlib.Path.cwd()
     ignore_path = root / IGNORE_FILE
@@ -47,22 +283,21 @@ def clean(perform_delete=False):
     mode_label = "DELETING" if perform_delete else "DRY RUN (Safe Mode)"
     print(f"--- {mode_label} ---")
 
-    # Sort by depth so we delete files inside folders before the folders themselves
-    to_delete.sort(key=lambda p: len(p.parts), reverse=True)
+    if not perform_delete:
+        for _path, rel_path, _is_dir in to_delete:
+            print(f"○ Would remove: {rel_path}")
+        return
 
-    for path in to_delete:
-        rel_path = path.relative_to(root)
-        if perform_delete:
+    # Matches never overlap, so each removal is independent of the others
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = {ex.submit(remove_path, path, is_dir): rel_path for path, rel_path, is_dir in to_delete}
+        for future in as_completed(futures):
+            rel_path = futures[future]
             try:
-                if path.is_dir():
-                    shutil.rmtree(path)
-                else:
-                    path.unlink()
+                future.result()
                 print(f"✔ Removed: {rel_path}")
             except Exception as e:
                 print(f"✘ Error removing {rel_path}: {e}")
-        else:
-            print(f"○ Would remove: {rel_path}")
 
 def main():
     """Main entry point for the clean build files tool."""
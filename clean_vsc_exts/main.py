@@ -7,11 +7,20 @@ and removes old versions of extensions, keeping only the latest version.
 """
 
 import argparse
+import os
 import sys
-import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from itertools import groupby
 from pathlib import Path
-from typing import Set, List, Dict, Tuple
-from collections import defaultdict
+from typing import Set, List, Optional, Tuple
+
+
+MAX_WORKERS = min(16, (os.cpu_count() or 4) * 2)
+# Unlink files relative to an open directory descriptor (POSIX unlinkat);
+# directories themselves are always opened and removed by full path
+DIR_FD_SUPPORTED = os.unlink in os.supports_dir_fd and os.scandir in os.supports_fd
+DIR_OPEN_FLAGS = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | getattr(os, "O_NOFOLLOW", 0)
 
 
 def read_extensions_to_keep(file_path: str) -> Set[str]:
@@ -29,8 +38,13 @@ def read_extensions_to_keep(file_path: str) -> Set[str]:
         PermissionError: If the file can't be read
     """
     try:
+        extensions = set()
         with open(file_path, 'r') as f:
-            extensions = {line.strip() for line in f if line.strip() and not line.strip().startswith('#')}
+            for line in f:
+                # Blank lines and comments (including indented ones) are skipped
+                name = line.strip()
+                if name and name[0] != '#':
+                    extensions.add(name)
         return extensions
     except FileNotFoundError:
         print(f"Error: File '{file_path}' not found.", file=sys.stderr)
@@ -78,12 +92,15 @@ def get_installed_extensions(extensions_dir: Path) -> List[Path]:
         raise NotADirectoryError(f"Not a directory: {extensions_dir}")
     
     try:
-        return [d for d in extensions_dir.iterdir() if d.is_dir()]
+        # DirEntry.is_dir() uses the file type from the directory listing, avoiding a stat per entry
+        with os.scandir(extensions_dir) as it:
+            return [Path(e.path) for e in it if e.is_dir(follow_symlinks=False)]
     except PermissionError:
         print(f"Error: Permission denied accessing '{extensions_dir}'.", file=sys.stderr)
         raise
 
 
+@lru_cache(maxsize=None)
 def extract_base_name(extension_dir_name: str) -> str:
     """
     Extract the base extension name from a directory name.
@@ -108,21 +125,19 @@ def extract_base_name(extension_dir_name: str) -> str:
     
     # The base name is usually the first part that doesn't start with a digit
     # We need to find the first part that looks like a version (starts with digit)
-    base_parts = []
-    for i, part in enumerate(parts):
-        if i == 0:
-            # Always include the first part (publisher.extension)
-            base_parts.append(part)
-        elif part and part[0].isdigit():
+    # Always include the first part (publisher.extension)
+    base_parts = [parts[0]]
+    for part in parts[1:]:
+        if '0' <= part[:1] <= '9':
             # Found version number, stop here
             break
-        else:
-            # Still part of the name
-            base_parts.append(part)
+        # Still part of the name
+        base_parts.append(part)
     
     return '-'.join(base_parts)
 
 
+@lru_cache(maxsize=None)
 def extract_version_info(extension_dir_name: str) -> Tuple[str, str]:
     """
     Extract version information from an extension directory name.
@@ -150,150 +165,163 @@ def extract_version_info(extension_dir_name: str) -> Tuple[str, str]:
         return (remainder, "")
 
 
-def compare_versions(ver1: str, ver2: str) -> int:
+def _version_key(extension_dir_name: str) -> Tuple[Tuple[int, str], ...]:
     """
-    Compare two version strings.
+    Build a sort key for the version in an extension directory name.
+    
+    Each part compares on its leading digits as an integer, then on the rest
+    as a string, so "5-linux" ranks above "5" and "4". Parts without leading
+    digits rank below numeric ones. Every part has the same (int, str) shape
+    so keys always compare.
     
     Args:
-        ver1: First version string
-        ver2: Second version string
+        extension_dir_name: The full directory name
         
     Returns:
-        -1 if ver1 < ver2, 0 if equal, 1 if ver1 > ver2
+        Tuple with one (number, text) pair per dot-separated version part
     """
-    if not ver1 and not ver2:
-        return 0
-    if not ver1:
-        return -1
-    if not ver2:
-        return 1
-    
-    # Split by dots and compare each part
-    parts1 = ver1.split('.')
-    parts2 = ver2.split('.')
-    
-    for i in range(max(len(parts1), len(parts2))):
-        p1 = parts1[i] if i < len(parts1) else '0'
-        p2 = parts2[i] if i < len(parts2) else '0'
-        
-        # Try to compare as integers first
-        try:
-            n1 = int(p1)
-            n2 = int(p2)
-            if n1 < n2:
-                return -1
-            elif n1 > n2:
-                return 1
-        except ValueError:
-            # Fallback to string comparison
-            if p1 < p2:
-                return -1
-            elif p1 > p2:
-                return 1
-    
-    return 0
+    version, _arch = extract_version_info(extension_dir_name)
+    if not version:
+        return ()
+    key = []
+    for part in version.split('.'):
+        # ASCII digits only: str.isdigit() accepts characters like "²" that int() rejects
+        rest = part.lstrip("0123456789")
+        digits = part[:len(part) - len(rest)]
+        key.append((int(digits) if digits else -1, rest))
+    return tuple(key)
 
 
-def find_latest_version(extension_dirs: List[Path]) -> Path:
+def should_keep_extension(extension_dir: Path, keep_list: Set[str]) -> bool:
     """
-    Find the extension directory with the latest version.
+    Determine if an extension should be kept based on the keep list.
     
     Args:
-        extension_dirs: List of extension directories with the same base name
+        extension_dir: Path to the extension directory
+        keep_list: Set of extension names to keep
         
     Returns:
-        The Path to the extension with the latest version
+        True if the extension should be kept, False otherwise
     """
-    if len(extension_dirs) == 1:
-        return extension_dirs[0]
-    
-    latest = extension_dirs[0]
-    latest_version, latest_arch = extract_version_info(latest.name)
+    dir_name = extension_dir.name
+    base_name = extract_base_name(dir_name)
     
-    for ext_dir in extension_dirs[1:]:
-        version, arch = extract_version_info(ext_dir.name)
-        
-        cmp_result = compare_versions(version, latest_version)
-        if cmp_result > 0:
-            latest = ext_dir
-            latest_version = version
-            latest_arch = arch
-        elif cmp_result == 0:
-            # Same version, prefer native architecture or longer name (more specific)
-            if len(ext_dir.name) > len(latest.name):
-                latest = ext_dir
-                latest_version = version
-                latest_arch = arch
-    
-    return latest
+    return base_name in keep_list
 
 
-def group_extensions_by_base_name(extension_dirs: List[Path]) -> Dict[str, List[Path]]:
+def _unlink_files_at(dir_path: str, subdirs: List[str]) -> None:
     """
-    Group extension directories by their base name.
+    Unlink the non-directory entries of dir_path and queue its subdirectories.
+    
+    Files are removed relative to an open descriptor of dir_path
+    (unlinkat), so the kernel does not walk the full path again for each
+    one. Only that one descriptor is held open.
     
     Args:
-        extension_dirs: List of all extension directories
-        
-    Returns:
-        Dictionary mapping base names to lists of extension directories
+        dir_path: Path of the directory to process
+        subdirs: List that the paths of subdirectories are appended to
     """
-    grouped = defaultdict(list)
-    for ext_dir in extension_dirs:
-        base_name = extract_base_name(ext_dir.name)
-        grouped[base_name].append(ext_dir)
-    return grouped
+    fd = os.open(dir_path, DIR_OPEN_FLAGS)
+    try:
+        with os.scandir(fd) as it:
+            entries = [(entry.name, entry.is_dir(follow_symlinks=False)) for entry in it]
+        for name, is_dir in entries:
+            if is_dir:
+                subdirs.append(os.path.join(dir_path, name))
+            else:
+                os.unlink(name, dir_fd=fd)
+    finally:
+        os.close(fd)
 
 
-def should_keep_extension(extension_dir: Path, keep_list: Set[str]) -> bool:
+def _fast_rmtree(path: Path) -> None:
     """
-    Determine if an extension should be kept based on the keep list.
+    Remove a directory tree with one scandir pass and plain unlink/rmdir calls.
+    
+    Unlike shutil.rmtree there is no extra stat per entry: the file type comes
+    from the directory listing. Symlinks and junctions are unlinked, never
+    followed. The walk uses an explicit stack, so deep trees don't hit the
+    recursion limit.
     
     Args:
-        extension_dir: Path to the extension directory
-        keep_list: Set of extension names to keep
+        path: Path to the directory to remove
         
-    Returns:
-        True if the extension should be kept, False otherwise
+    Raises:
+        OSError: If path is a symlink or anything in the tree can't be removed
     """
-    dir_name = extension_dir.name
-    base_name = extract_base_name(dir_name)
-    
-    return base_name in keep_list
+    if path.is_symlink() or path.is_junction():
+        raise OSError(f"Cannot call rmtree on a symbolic link or junction: {path}")
+    stack = [os.fspath(path)]
+    dirs = []
+    while stack:
+        dir_path = stack.pop()
+        if DIR_FD_SUPPORTED:
+            _unlink_files_at(dir_path, stack)
+        else:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    # Like shutil.rmtree, treat NTFS junctions as links: unlink
+                    # them rather than deleting their target's contents
+                    if entry.is_dir(follow_symlinks=False) and not entry.is_junction():
+                        stack.append(entry.path)
+                    else:
+                        os.unlink(entry.path)
+        dirs.append(dir_path)
+    # Subdirectories are always listed after their parent, so remove in reverse
+    for dir_path in reversed(dirs):
+        os.rmdir(dir_path)
 
 
-def remove_extension(extension_dir: Path, dry_run: bool = False, reason: str = "") -> bool:
+def remove_extension(
+    extension_dir: Path, dry_run: bool = False, reason: str = ""
+) -> Tuple[bool, str, str, Optional[Exception]]:
     """
     Remove an extension directory.
     
+    Nothing is printed, so this is safe to run from worker threads; pass the
+    result to report_removal.
+    
     Args:
         extension_dir: Path to the extension directory to remove
         dry_run: If True, only simulate the removal
         reason: Optional reason for removal to display
         
     Returns:
-        True if successful (or would be successful in dry run), False otherwise
+        Tuple of (success, extension name, reason, error) where error is None
+        on success
     """
     try:
-        if dry_run:
-            msg = f"[DRY RUN] Would remove: {extension_dir.name}"
-            if reason:
-                msg += f" ({reason})"
-            print(msg)
-            return True
-        else:
-            msg = f"Removed: {extension_dir.name}"
-            if reason:
-                msg += f" ({reason})"
-            shutil.rmtree(extension_dir)
-            print(msg)
-            return True
-    except PermissionError:
-        print(f"Error: Permission denied removing '{extension_dir.name}'.", file=sys.stderr)
-        return False
+        if not dry_run:
+            _fast_rmtree(extension_dir)
+        return (True, extension_dir.name, reason, None)
     except Exception as e:
-        print(f"Error removing '{extension_dir.name}': {e}", file=sys.stderr)
+        return (False, extension_dir.name, reason, e)
+
+
+def report_removal(result: Tuple[bool, str, str, Optional[Exception]], dry_run: bool = False) -> bool:
+    """
+    Print the outcome of a remove_extension call.
+    
+    Args:
+        result: Tuple returned by remove_extension
+        dry_run: If True, report the removal as simulated
+        
+    Returns:
+        True if successful (or would be successful in dry run), False otherwise
+    """
+    ok, name, reason, error = result
+    if not ok:
+        if isinstance(error, PermissionError):
+            print(f"Error: Permission denied removing '{name}'.", file=sys.stderr)
+        else:
+            print(f"Error removing '{name}': {error}", file=sys.stderr)
         return False
+    
+    msg = f"[DRY RUN] Would remove: {name}" if dry_run else f"Removed: {name}"
+    if reason:
+        msg += f" ({reason})"
+    print(msg)
+    return True
 
 
 def main():
@@ -354,43 +382,45 @@ def main():
     except (FileNotFoundError, NotADirectoryError, PermissionError) as e:
         return 1
     
-    # Group extensions by base name
-    grouped = group_extensions_by_base_name(installed)
+    # Sort so that directories sharing a base name are adjacent for groupby
+    installed.sort(key=lambda d: extract_base_name(d.name))
     
     # Process extensions
     to_remove = []
     to_keep = []
     old_versions_to_remove = []
+    keep_all_versions = args.keep_all_versions
+    verbose = args.verbose
     
-    for base_name, ext_dirs in grouped.items():
-        if base_name in keep_list:
-            # Extension is in keep list
-            if args.keep_all_versions:
-                # Keep all versions
-                to_keep.extend(ext_dirs)
-                if args.verbose:
-                    for ext_dir in ext_dirs:
-                        print(f"Keeping: {ext_dir.name}")
-            else:
-                # Keep only the latest version
-                latest = find_latest_version(ext_dirs)
-                to_keep.append(latest)
-                
-                if args.verbose:
-                    print(f"Keeping: {latest.name} (latest version)")
-                
-                # Mark older versions for removal
-                for ext_dir in ext_dirs:
-                    if ext_dir != latest:
-                        old_versions_to_remove.append(ext_dir)
-                        if args.verbose:
-                            print(f"Will remove old version: {ext_dir.name}")
-        else:
+    for base_name, group in groupby(installed, key=lambda d: extract_base_name(d.name)):
+        ext_dirs = list(group)
+        if base_name not in keep_list:
             # Extension not in keep list, remove all versions
             to_remove.extend(ext_dirs)
-            if args.verbose:
+            if verbose:
                 for ext_dir in ext_dirs:
                     print(f"Will remove (not in keep list): {ext_dir.name}")
+        elif keep_all_versions:
+            # Keep all versions
+            to_keep.extend(ext_dirs)
+            if verbose:
+                for ext_dir in ext_dirs:
+                    print(f"Keeping: {ext_dir.name}")
+        else:
+            # Keep only the latest version; for the same version prefer the
+            # longer name (more specific, e.g. with architecture)
+            latest = max(ext_dirs, key=lambda d: (_version_key(d.name), len(d.name)))
+            to_keep.append(latest)
+            if verbose:
+                print(f"Keeping: {latest.name} (latest version)")
+            
+            # Mark older versions for removal; latest came from ext_dirs, so an
+            # identity check is enough and skips Path.__eq__
+            for ext_dir in ext_dirs:
+                if ext_dir is not latest:
+                    old_versions_to_remove.append(ext_dir)
+                    if verbose:
+                        print(f"Will remove old version: {ext_dir.name}")
     
     # Summary
     print(f"\nSummary:")
@@ -412,19 +442,25 @@ def main():
     success_count = 0
     fail_count = 0
     
-    # Remove unwanted extensions
-    for ext_dir in to_remove:
-        if remove_extension(ext_dir, dry_run=args.dry_run, reason="not in keep list"):
-            success_count += 1
-        else:
-            fail_count += 1
+    work = [(ext_dir, "not in keep list") for ext_dir in to_remove]
+    work += [(ext_dir, "old version") for ext_dir in old_versions_to_remove]
     
-    # Remove old versions
-    for ext_dir in old_versions_to_remove:
-        if remove_extension(ext_dir, dry_run=args.dry_run, reason="old version"):
-            success_count += 1
-        else:
-            fail_count += 1
+    if args.dry_run:
+        for ext_dir, reason in work:
+            if report_removal(remove_extension(ext_dir, dry_run=True, reason=reason), dry_run=True):
+                success_count += 1
+            else:
+                fail_count += 1
+    else:
+        # Extension directories are independent siblings, so remove them concurrently
+        # and report from this thread as each one finishes
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = [executor.submit(remove_extension, ext_dir, reason=reason) for ext_dir, reason in work]
+            for future in as_completed(futures):
+                if report_removal(future.result()):
+                    success_count += 1
+                else:
+                    fail_count += 1
     
     # Final summary
     print(f"\nComplete!")